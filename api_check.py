@@ -0,0 +1,153 @@
+"""Проверка HTTP/JSON API без сети: запросы передаются в api_app как WSGI environ.
+
+Запускается из корня проекта: python api_check.py
+Работает на временной БД, рабочие данные не затрагиваются.
+"""
+import gzip
+import io
+import json
+import random
+import sys
+import tempfile
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+import bottle
+
+import main
+
+def call(method, path, body=None, query=None, raw=None, accept_gzip=False, app=None):
+    data = raw if raw is not None else json.dumps(body).encode('utf-8') if body is not None else b''
+    environ = {}
+    setup_testing_defaults(environ)
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(query or {}, doseq=True),
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'wsgi.input': io.BytesIO(data)
+    })
+    if accept_gzip:
+        environ['HTTP_ACCEPT_ENCODING'] = 'gzip, deflate'
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split()[0])
+        response['headers'] = dict(headers)
+
+    content = b''.join((app or main.api_app)(environ, start_response))
+    if response['headers'].get('Content-Encoding') == 'gzip':
+        content = gzip.decompress(content)
+    if response['headers'].get('Content-Type', '').startswith('application/json'):
+        content = json.loads(content)
+    return response['status'], response['headers'], content
+
+def random_bet(rnd):
+    return {
+        'event': f'Матч {rnd.randint(1, 100000)} — длинное название события для объема',
+        'coefficient': f'{rnd.uniform(1.1, 4.0):.2f}',
+        'bet_amount': str(rnd.randint(100, 5000)),
+        'date': f'{rnd.randint(1, 28)}.{rnd.randint(1, 12)}.2024',
+        'result': rnd.choice(['win', 'loss', 'return', 'pending']),
+        'source': rnd.choice(['Канал 1', 'Канал 2', 'Не указан'])
+    }
+
+def check_crud(rnd):
+    status, _, data = call('POST', '/api/bet', random_bet(rnd))
+    assert status == 200 and data['success'], data
+    bet_id = data['id']
+    status, _, data = call('PUT', f'/api/bet/{bet_id}', dict(random_bet(rnd), date='01.04.2024'))
+    assert data['success'], data
+    assert call('GET', f'/api/bet/{bet_id}')[2]['bet']['date'] == '2024-04-01'
+    assert call('DELETE', f'/api/bet/{bet_id}')[2]['success']
+    assert not call('DELETE', f'/api/bet/{bet_id}')[2]['success']
+    assert not call('POST', '/api/bet', dict(random_bet(rnd), date='31.02.2024'))[2]['success']
+
+def check_errors():
+    for raw in (b'{bad', b'[1, 2', b'\xff'):
+        status, _, data = call('POST', '/api/stats', raw=raw)
+        assert status == 400 and not data['success'], (raw, status, data)
+    status, _, data = call('GET', '/api/bets', query={'page': 'x'})
+    assert status == 400, data
+    status, _, data = call('GET', '/api/stats', query={'min_coeff': 'a', 'max_coeff': '2'})
+    assert status == 400, data
+    status, _, data = call('POST', '/api/import', {})
+    assert status == 400, data
+    assert call('GET', '/api/bet/abc')[0] == 404
+    # Маршруты окна Eel в API не входят
+    assert call('GET', '/', app=main.headless_app)[0] == 404
+    assert call('GET', '/eel', app=main.headless_app)[0] == 404
+
+def check_pagination(total):
+    status, _, data = call('GET', '/api/bets', query={'page': 2, 'page_size': 25})
+    assert status == 200 and data['total'] == total and len(data['bets']) == 25
+    first = call('GET', '/api/bets', query={'page': 1, 'page_size': 50})[2]['bets']
+    assert [b['id'] for b in first[25:]] == [b['id'] for b in data['bets']]
+    data = call('GET', '/api/bets', query={'page': 0, 'page_size': 0})[2]
+    assert data['page'] == 1 and data['page_size'] == 1 and len(data['bets']) == 1
+    data = call('GET', '/api/bets', query={'page_size': 100000})[2]
+    assert data['page_size'] == main.API_MAX_PAGE_SIZE
+    data = call('GET', '/api/bets', query={'page': 10 ** 6})[2]
+    assert data['bets'] == [] and data['total'] == total
+    data = call('POST', '/api/bets', {'source_filter': 'Канал 1', 'page_size': 1000})[2]
+    assert data['bets'] and all(b['source'] == 'Канал 1' for b in data['bets'])
+
+def check_gzip():
+    status, headers, plain = call('GET', '/api/bets', query={'page_size': 200})
+    assert 'Content-Encoding' not in headers and headers['Vary'] == 'Accept-Encoding'
+    status, headers, compressed = call('GET', '/api/bets', query={'page_size': 200}, accept_gzip=True)
+    assert headers.get('Content-Encoding') == 'gzip' and compressed == plain
+    status, headers, _ = call('GET', '/api/profiles', accept_gzip=True)
+    assert 'Content-Encoding' not in headers, 'маленькие ответы не сжимаются'
+
+def check_consolidated():
+    main.switch_profile('Второй')
+    main.add_bet({'event': 'x', 'coefficient': '2', 'bet_amount': '10', 'date': '01.01.2024', 'result': 'win'})
+    main.switch_profile(main.DEFAULT_PROFILE)
+    one = call('GET', '/api/consolidated_stats', query={'profiles': 'Второй'})[2]
+    assert one['success'] and one['profiles'] == ['Второй'] and one['stats']['total_bets'] == 1, one
+    both = call('GET', '/api/consolidated_stats', query={'profiles': ['Второй', main.DEFAULT_PROFILE]})[2]
+    assert both['profiles'] == ['Второй', main.DEFAULT_PROFILE], both
+    assert call('POST', '/api/consolidated_stats', {'profiles': ['Второй']})[2]['stats']['total_bets'] == 1
+    for bad in ('Второй', {'a': 1}, [1]):
+        status, _, data = call('POST', '/api/consolidated_stats', {'profiles': bad})
+        assert status == 400 and not data['success'], (bad, data)
+    assert call('GET', '/api/consolidated_stats')[2]['profiles'] == [main.DEFAULT_PROFILE, 'Второй']
+
+def check_import_round_trip():
+    stats = call('GET', '/api/stats')[2]['stats']
+    export = call('GET', '/api/export')[2]
+    assert export['success']
+    payload = {'data': 'data:application/octet-stream;base64,' + export['data']}
+    size = len(json.dumps(payload))
+    assert size > bottle.BaseRequest.MEMFILE_MAX, f'экспорт слишком мал для проверки: {size} байт'
+    status, _, data = call('POST', '/api/import', payload)
+    assert status == 200 and data['success'], (status, data)
+    imported = call('GET', '/api/stats')[2]['stats']
+    assert imported == stats, (stats, imported)
+    assert main.check_ledger_cache()['consistent']
+
+def run(seed=1):
+    rnd = random.Random(seed)
+    main.active_profile.open()
+    for _ in range(3000):
+        main.add_bet(random_bet(rnd))
+    check_crud(rnd)
+    check_errors()
+    check_pagination(3000)
+    check_gzip()
+    check_consolidated()
+    check_import_round_trip()
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        main.get_application_path = lambda: tmp
+        main.active_profile = main.profiles[main.DEFAULT_PROFILE] = main.Profile(main.DEFAULT_PROFILE)
+        try:
+            run()
+        finally:
+            for profile in main.profiles.values():
+                profile.close()
+    print('API работает корректно')
+    sys.exit(0)
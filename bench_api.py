@@ -0,0 +1,149 @@
+"""Нагрузочный тест headless API (python main.py --headless).
+
+Тест добавляет, изменяет и удаляет ставки, поэтому сервер нужно запускать
+на отдельном профиле. С основным профилем тест не запускается:
+
+    python main.py --headless --profile Тест
+    python bench_api.py --url http://localhost:8000 --clients 8 --requests 2000
+"""
+import argparse
+import gzip
+import json
+import sys
+import random
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+MONTHS = ['all', 'january', 'february', 'march', 'april', 'may', 'june',
+          'july', 'august', 'september', 'october', 'november', 'december']
+
+# Доля каждого типа запроса в смеси (веса для random.choices)
+REQUEST_MIX = [
+    (40, 'stats'),
+    (30, 'bets'),
+    (10, 'calculate_stats'),
+    (10, 'add_bet'),
+    (5, 'update_bet'),
+    (3, 'chart'),
+    (2, 'delete_bet'),
+]
+
+def random_bet(rnd):
+    bet_date = datetime.now() - timedelta(days=rnd.randint(0, 365))
+    return {
+        'event': f'Матч {rnd.randint(1, 10000)}',
+        'coefficient': f'{rnd.uniform(1.2, 4.0):.2f}',
+        'bet_amount': str(rnd.randint(100, 5000)),
+        'date': bet_date.strftime('%d.%m.%Y'),
+        'result': rnd.choice(['win', 'loss', 'return', 'pending']),
+        'source': rnd.choice(['Не указан', 'Канал 1', 'Канал 2', 'Канал 3'])
+    }
+
+def build_request(kind, rnd, known_ids, lock):
+    filters = {'date_filter': rnd.choice(MONTHS)}
+    if kind == 'stats':
+        return 'POST', '/api/stats', filters
+    if kind == 'bets':
+        return 'POST', '/api/bets', dict(filters, page=rnd.randint(1, 5), page_size=100)
+    if kind == 'calculate_stats':
+        return 'POST', '/api/calculate_stats', filters
+    if kind == 'chart':
+        return 'POST', '/api/chart', filters
+    if kind == 'add_bet':
+        return 'POST', '/api/bet', random_bet(rnd)
+    with lock:
+        if not known_ids:
+            return 'POST', '/api/stats', filters
+        if kind == 'update_bet':
+            return 'PUT', f'/api/bet/{rnd.choice(known_ids)}', random_bet(rnd)
+        # Удаляемая ставка сразу убирается из списка, чтобы ее не выбрал другой клиент
+        bet_id = known_ids.pop(rnd.randrange(len(known_ids)))
+    return 'DELETE', f'/api/bet/{bet_id}', None
+
+def send(base_url, method, path, body):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method, headers={
+        'Content-Type': 'application/json',
+        'Accept-Encoding': 'gzip'
+    })
+    with urllib.request.urlopen(request) as response:
+        data = response.read()
+        size = len(data)
+        if response.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return response.status, size, json.loads(data)
+
+def get_json(base_url, path):
+    return send(base_url, 'GET', path, None)[2]
+
+def run_client(base_url, kinds, weights, count, seed, known_ids, results, lock):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        kind = rnd.choices(kinds, weights)[0]
+        method, path, body = build_request(kind, rnd, known_ids, lock)
+        started = time.perf_counter()
+        try:
+            status, size, data = send(base_url, method, path, body)
+            ok = status == 200 and data.get('success', True)
+        except (OSError, ValueError):
+            ok, size, data = False, 0, {}
+        elapsed = time.perf_counter() - started
+        with lock:
+            results[kind].append((elapsed, ok, size))
+            if kind == 'add_bet' and ok:
+                known_ids.append(data['id'])
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API Bet Tracker PRO')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000, help='всего запросов')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    profile = get_json(args.url, '/api/profiles')['active']
+    if profile == 'Основной':
+        sys.exit('Сервер работает с основным профилем. Запустите его на отдельном профиле: '
+                 'python main.py --headless --profile Тест')
+
+    known_ids = [bet['id'] for bet in get_json(args.url, '/api/bets?page_size=1000')['bets']]
+
+    weights, kinds = zip(*REQUEST_MIX)
+    results = defaultdict(list)
+    lock = threading.Lock()
+    per_client = max(args.requests // args.clients, 1)
+    threads = [
+        threading.Thread(target=run_client, args=(args.url, kinds, weights, per_client,
+                                                  args.seed + i, known_ids, results, lock))
+        for i in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(r) for r in results.values())
+    print(f'Профиль: {profile}')
+    print(f'{total} запросов за {elapsed:.2f} с, {total / elapsed:.1f} запр/с, клиентов: {args.clients}')
+    print(f'{"запрос":<16}{"кол-во":>8}{"ошибки":>8}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"байт":>10}')
+    for kind in kinds:
+        rows = results.get(kind, [])
+        times = [r[0] * 1000 for r in rows]
+        errors = sum(1 for r in rows if not r[1])
+        size = sum(r[2] for r in rows) // len(rows) if rows else 0
+        print(f'{kind:<16}{len(rows):>8}{errors:>8}{percentile(times, 50):>10.1f}'
+              f'{percentile(times, 95):>10.1f}{percentile(times, 99):>10.1f}{size:>10}')
+
+if __name__ == '__main__':
+    main()
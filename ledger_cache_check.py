@@ -0,0 +1,115 @@
+"""Проверка согласованности кэша ставок с БД после операций записи.
+
+Запускается из корня проекта: python ledger_cache_check.py
+Работает на временной БД, рабочие данные не затрагиваются.
+"""
+import base64
+import io
+import random
+import sys
+import tempfile
+
+import pandas as pd
+
+import main
+
+FILTERS = [
+    (None, None, None),
+    ('march', None, 'Канал 1'),
+    ('all', {'min': 1.5, 'max': 2.5}, 'Не указан'),
+    ('june', None, 'Нет такого'),
+    (None, {'min': 2, 'max': 3}, 'all'),
+]
+
+def random_bet(rnd):
+    return {
+        'event': f'Матч {rnd.randint(1, 1000)}',
+        'coefficient': f'{rnd.uniform(1.1, 4.0):.2f}',
+        'bet_amount': str(rnd.randint(1, 100)),
+        'date': f'{rnd.randint(1, 28)}.{rnd.randint(1, 12)}.2024',
+        'result': rnd.choice(['win', 'loss', 'return', 'pending']),
+        'source': rnd.choice(['Канал 1', 'Канал 2', 'Не указан'])
+    }
+
+def excel_payload(rows):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        pd.DataFrame(rows).to_excel(writer, index=False)
+    return 'data:application/octet-stream;base64,' + base64.b64encode(output.getvalue()).decode('utf-8')
+
+def read_all():
+    return (
+        [main.compute_stats(main.get_settled_bets(*f)) for f in FILTERS],
+        [main.get_bets_for_table(*f) for f in FILTERS],
+        main.get_sources(),
+        main.get_available_months()
+    )
+
+def assert_consistent(step):
+    report = main.check_ledger_cache()
+    assert report['enabled'], f'{step}: кэш отключен'
+    assert report['consistent'], f'{step}: {report["mismatches"][:5]}'
+    cache = main.active_profile.ledger_cache
+    cached = read_all()
+    main.active_profile.ledger_cache = None
+    try:
+        from_db = read_all()
+    finally:
+        main.active_profile.ledger_cache = cache
+    assert cached == from_db, f'{step}: кэш и SQL дают разные результаты'
+
+def run(seed=1):
+    rnd = random.Random(seed)
+    main.active_profile.open()
+    for _ in range(50):
+        assert main.add_bet(random_bet(rnd))['success']
+    assert_consistent('добавление')
+
+    main.add_bet(dict(random_bet(rnd), date='05.03.2024', source='Б'))
+    main.add_bet(dict(random_bet(rnd), date='01.03.2024', source='А'))
+    sources = main.get_sources()
+    main.active_profile.load_cache()
+    assert main.get_sources() == sources, 'порядок источников изменился после перезагрузки кэша'
+    assert_consistent('порядок источников')
+
+    footprint = main.get_ledger_cache().memory_footprint()
+    assert 40 < footprint['bytes_per_bet'] < 1000, footprint
+    assert 0 < footprint['fixed_bytes'] < footprint['bytes'], footprint
+
+    bad_date = dict(random_bet(rnd), date='31.02.2024')
+    assert not main.add_bet(bad_date)['success']
+    assert not main.update_bet(1, bad_date)['success']
+    assert main.get_bet(1)['success']
+    assert_consistent('некорректная дата')
+
+    for _ in range(100):
+        bet_id = rnd.randint(1, 60)
+        if rnd.random() < 0.7:
+            main.update_bet(bet_id, random_bet(rnd))
+        else:
+            main.delete_bet(bet_id)
+    assert_consistent('изменение и удаление')
+
+    export = main.export_to_excel()
+    assert export['success']
+    rows = pd.read_excel(io.BytesIO(base64.b64decode(export['data']))).to_dict('records')
+    rows.append(dict(rows[0], **{'Дата': '5-1-2024'}))
+    rows.append(dict(rows[0], **{'Дата': '31.02.2024'}))
+    assert main.import_from_excel(excel_payload(rows))['success']
+    assert main.get_ledger_cache() is not None, 'кэш не восстановлен после импорта'
+    assert_consistent('импорт')
+
+    for _ in range(20):
+        main.add_bet(random_bet(rnd))
+    assert_consistent('добавление после импорта')
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        main.get_application_path = lambda: tmp
+        main.active_profile = main.profiles[main.DEFAULT_PROFILE] = main.Profile(main.DEFAULT_PROFILE)
+        try:
+            run()
+        finally:
+            main.active_profile.close()
+    print('Кэш ставок согласован с БД')
+    sys.exit(0)
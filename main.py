@@ -9,10 +9,18 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import io
 import base64
+import gzip
+import json
+import argparse
 from collections import namedtuple
 import pandas as pd
 import eel
+import bottle
 import random
+import re
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
 from matplotlib.ticker import MaxNLocator
 
 def kill_child_processes():
@@ -37,27 +45,45 @@ def resource_path(relative_path):
 
 eel.init(resource_path('web'))
 
-def get_db_path():
+DEFAULT_PROFILE = 'Основной'
+
+def get_application_path():
     if getattr(sys, 'frozen', False):
-        application_path = os.path.dirname(sys.executable)
-    else:
-        application_path = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(application_path, 'bets.db')
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+def get_profiles_dir():
+    return os.path.join(get_application_path(), 'profiles')
+
+def get_profile_db_path(name):
+    if name == DEFAULT_PROFILE:
+        return os.path.join(get_application_path(), 'bets.db')
+    return os.path.join(get_profiles_dir(), f'{name}.db')
+
+def get_db_path():
+    return active_profile.db_path
 
-def check_and_create_db():
-    db_path = get_db_path()
+def check_and_create_db(db_path=None):
+    db_path = db_path or get_db_path()
     if not os.path.exists(db_path):
         print(f"База данных не найдена, создаем новую: {db_path}")
-        init_db()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        init_db(db_path)
 
-def get_db_connection():
-    db_path = get_db_path()
+def open_db_connection(db_path):
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     return conn
 
-def init_db():
-    conn = get_db_connection()
+def get_db_connection():
+    return active_profile.connection()
+
+def rollback_db():
+    if active_profile.conn is not None:
+        active_profile.conn.rollback()
+
+def init_db(db_path=None):
+    conn = open_db_connection(db_path or get_db_path())
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS bets (
@@ -79,25 +105,452 @@ Stats = namedtuple('Stats', [
     'win_streak', 'loss_streak'
 ])
 
+MONTH_MAPPING = {
+    'january': '01', 'february': '02', 'march': '03',
+    'april': '04', 'may': '05', 'june': '06',
+    'july': '07', 'august': '08', 'september': '09',
+    'october': '10', 'november': '11', 'december': '12'
+}
+
+RESULT_CODES = ('win', 'loss', 'return', 'pending')
+POINTER_SIZE = struct.calcsize('P')
+
+class LedgerCache:
+    """Колоночный кэш таблицы bets в памяти.
+
+    Строки отсортированы по (date, id). Числа хранятся в array-колонках,
+    результат - int8 код, источник - индекс в таблице интернированных строк.
+    """
+    __slots__ = (
+        'ids', 'coefficients', 'amounts', 'dates', 'results', 'source_ids',
+        'events', 'result_table', 'result_index',
+        'source_table', 'source_index', 'source_counts'
+    )
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ids = array('q')
+        self.coefficients = array('d')
+        self.amounts = array('d')
+        self.dates = array('i')
+        self.results = array('b')
+        self.source_ids = array('i')
+        self.events = []
+        self.result_table = list(RESULT_CODES)
+        self.result_index = {result: code for code, result in enumerate(RESULT_CODES)}
+        self.source_table = []
+        self.source_index = {}
+        self.source_counts = []
+
+    def load(self, conn):
+        fresh = LedgerCache()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, event, coefficient, bet_amount, date, result, source
+            FROM bets ORDER BY date ASC, id ASC
+        ''')
+        for row in cursor.fetchall():
+            fresh.ids.append(row[0])
+            fresh.events.append(row[1])
+            fresh.coefficients.append(row[2])
+            fresh.amounts.append(row[3])
+            fresh.dates.append(datetime.fromisoformat(row[4][:10]).toordinal())
+            fresh.results.append(fresh._intern_result(row[5]))
+            source_id = fresh._intern_source(row[6])
+            fresh.source_ids.append(source_id)
+            fresh.source_counts[source_id] += 1
+        for name in self.__slots__:
+            setattr(self, name, getattr(fresh, name))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _intern_result(self, result):
+        code = self.result_index.get(result)
+        if code is None:
+            if len(self.result_table) >= 127:
+                raise ValueError(f'Слишком много различных результатов: {result}')
+            code = len(self.result_table)
+            self.result_table.append(result)
+            self.result_index[result] = code
+        return code
+
+    def _intern_source(self, source):
+        source_id = self.source_index.get(source)
+        if source_id is None:
+            source_id = len(self.source_table)
+            self.source_table.append(source)
+            self.source_index[source] = source_id
+            self.source_counts.append(0)
+        return source_id
+
+    def _position(self, date_ordinal, bet_id):
+        lo = bisect_left(self.dates, date_ordinal)
+        hi = bisect_right(self.dates, date_ordinal, lo)
+        return bisect_left(self.ids, bet_id, lo, hi)
+
+    def _encode(self, date, result, source):
+        date_ordinal = datetime.fromisoformat(date).toordinal()
+        result_code = self._intern_result(result)
+        return date_ordinal, result_code, self._intern_source(source)
+
+    def _insert_encoded(self, bet_id, event, coefficient, bet_amount, date_ordinal, result_code, source_id):
+        pos = self._position(date_ordinal, bet_id)
+        self.ids.insert(pos, bet_id)
+        self.events.insert(pos, event)
+        self.coefficients.insert(pos, coefficient)
+        self.amounts.insert(pos, bet_amount)
+        self.dates.insert(pos, date_ordinal)
+        self.results.insert(pos, result_code)
+        self.source_ids.insert(pos, source_id)
+        self.source_counts[source_id] += 1
+
+    def insert(self, bet_id, event, coefficient, bet_amount, date, result, source):
+        encoded = self._encode(date, result, source)
+        self._insert_encoded(bet_id, event, coefficient, bet_amount, *encoded)
+
+    def remove(self, bet_id):
+        try:
+            pos = self.ids.index(bet_id)
+        except ValueError:
+            return False
+        self.source_counts[self.source_ids[pos]] -= 1
+        for column in (self.ids, self.events, self.coefficients, self.amounts,
+                       self.dates, self.results, self.source_ids):
+            del column[pos]
+        return True
+
+    def update(self, bet_id, event, coefficient, bet_amount, date, result, source):
+        encoded = self._encode(date, result, source)
+        self.remove(bet_id)
+        self._insert_encoded(bet_id, event, coefficient, bet_amount, *encoded)
+
+    def _select(self, date_filter=None, coeff_filter=None, source_filter=None, include_pending=True):
+        month = None
+        if date_filter and date_filter != 'all':
+            month_num = MONTH_MAPPING.get(date_filter.lower())
+            if month_num:
+                month = int(month_num)
+
+        min_coeff = max_coeff = None
+        if coeff_filter and isinstance(coeff_filter, dict):
+            if coeff_filter.get('min') is not None and coeff_filter.get('max') is not None:
+                min_coeff = float(coeff_filter['min'])
+                max_coeff = float(coeff_filter['max'])
+
+        source_ids = None
+        if source_filter and source_filter != 'all':
+            if source_filter == 'Не указан':
+                candidates = (None, 'Не указан')
+            else:
+                candidates = (source_filter,)
+            source_ids = {self.source_index[s] for s in candidates if s in self.source_index}
+
+        pending = self.result_index['pending']
+        dates = self.dates
+        months = {}
+        positions = []
+        for i in range(len(self.ids)):
+            if not include_pending and self.results[i] == pending:
+                continue
+            if month is not None:
+                bet_month = months.get(dates[i])
+                if bet_month is None:
+                    bet_month = months[dates[i]] = datetime.fromordinal(dates[i]).month
+                if bet_month != month:
+                    continue
+            if min_coeff is not None and not (min_coeff <= self.coefficients[i] <= max_coeff):
+                continue
+            if source_ids is not None and self.source_ids[i] not in source_ids:
+                continue
+            positions.append(i)
+        return positions
+
+    def _bet_dict(self, i):
+        bet_date = datetime.fromordinal(self.dates[i])
+        return {
+            'id': self.ids[i],
+            'event': self.events[i],
+            'coefficient': self.coefficients[i],
+            'bet_amount': self.amounts[i],
+            'date': bet_date.strftime('%Y-%m-%d'),
+            'result': self.result_table[self.results[i]],
+            'source': self.source_table[self.source_ids[i]],
+            'formatted_date': bet_date.strftime('%d.%m.%Y')
+        }
+
+    def settled_bets(self, date_filter=None, coeff_filter=None, source_filter=None):
+        return [
+            (self.dates[i], self.result_table[self.results[i]], self.coefficients[i], self.amounts[i])
+            for i in self._select(date_filter, coeff_filter, source_filter, include_pending=False)
+        ]
+
+    def bets_for_table(self, date_filter=None, coeff_filter=None, source_filter=None):
+        positions = self._select(date_filter, coeff_filter, source_filter)
+        return [self._bet_dict(i) for i in reversed(positions)]
+
+    def bets_page(self, date_filter=None, coeff_filter=None, source_filter=None, offset=0, limit=100):
+        positions = self._select(date_filter, coeff_filter, source_filter)
+        positions.reverse()
+        return [self._bet_dict(i) for i in positions[offset:offset + limit]], len(positions)
+
+    def sources(self):
+        return sorted(
+            source for source, count in zip(self.source_table, self.source_counts)
+            if count and source is not None and source != 'Не указан'
+        )
+
+    def available_months(self):
+        months = {datetime.fromordinal(d).month for d in set(self.dates)}
+        return [f'{month:02d}' for month in sorted(months, reverse=True)]
+
+    def source_balance_history(self, source):
+        return balance_history_by_day(self.settled_bets(source_filter=source))
+
+    def memory_footprint(self):
+        columns = (self.ids, self.coefficients, self.amounts, self.dates,
+                   self.results, self.source_ids)
+        count = len(self)
+        event_bytes = sum(sys.getsizeof(e) for e in self.events)
+        total = sum(sys.getsizeof(column) for column in columns)
+        total += sys.getsizeof(self.events) + event_bytes
+        total += sys.getsizeof(self.source_table) + sum(sys.getsizeof(s) for s in self.source_table)
+        total += sys.getsizeof(self.source_index) + sys.getsizeof(self.source_counts)
+        # Строка на ставку: элементы колонок, указатель в списке events и сама строка события.
+        # Источники интернированы, их строки входят в постоянную часть.
+        per_bet = sum(column.itemsize for column in columns) + POINTER_SIZE
+        per_bet += event_bytes / count if count else 0
+        return {
+            'bets': count,
+            'bytes': total,
+            'bytes_per_bet': round(per_bet, 1),
+            'bytes_per_100k': int(per_bet * 100000),
+            'fixed_bytes': max(int(total - per_bet * count), 0)
+        }
+
+    def verify(self, conn):
+        fresh = LedgerCache()
+        try:
+            fresh.load(conn)
+        except Exception as e:
+            return [f'Не удалось прочитать ставки из БД: {e}']
+        mismatches = []
+        if len(fresh) != len(self):
+            mismatches.append(f'Количество ставок: кэш {len(self)}, БД {len(fresh)}')
+        cached = {self.ids[i]: self._bet_dict(i) for i in range(len(self))}
+        for i in range(len(fresh)):
+            expected = fresh._bet_dict(i)
+            actual = cached.pop(expected['id'], None)
+            if actual != expected:
+                mismatches.append(f'Ставка {expected["id"]}: кэш {actual}, БД {expected}')
+        for bet_id in cached:
+            mismatches.append(f'Ставка {bet_id} отсутствует в БД')
+        if list(fresh.ids) != list(self.ids):
+            mismatches.append('Порядок ставок в кэше не совпадает с БД')
+        db_sources = query_sources(conn)
+        if self.sources() != db_sources:
+            mismatches.append(f'Источники: кэш {self.sources()}, БД {db_sources}')
+        return mismatches
+
+LEDGER_CACHE_ENABLED = True
+MAX_ATTACHED_DATABASES = 10
+PROFILE_NAME_PATTERN = re.compile(r'[^<>:"/\\|?*\x00-\x1f.][^<>:"/\\|?*\x00-\x1f]{0,63}')
+WINDOWS_RESERVED_NAMES = {'CON', 'PRN', 'AUX', 'NUL'} | {f'{device}{i}' for device in ('COM', 'LPT') for i in range(1, 10)}
+
+class Profile:
+    """Банк (профиль) со своей БД, соединением, кэшем и версией данных."""
+    __slots__ = ('name', 'db_path', 'conn', 'ledger_cache', 'data_version')
+
+    def __init__(self, name):
+        self.name = name
+        self.db_path = get_profile_db_path(name)
+        self.conn = None
+        self.ledger_cache = None
+        self.data_version = 0
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = open_db_connection(self.db_path)
+        return self.conn
+
+    def open(self):
+        check_and_create_db(self.db_path)
+        if LEDGER_CACHE_ENABLED and self.ledger_cache is None:
+            self.load_cache()
+
+    def load_cache(self):
+        try:
+            cache = LedgerCache()
+            cache.load(self.connection())
+            self.ledger_cache = cache
+            footprint = cache.memory_footprint()
+            print(f"Кэш ставок профиля '{self.name}' загружен: {footprint['bets']} ставок, "
+                  f"{footprint['bytes']} байт (~{footprint['bytes_per_100k']} байт на 100k ставок "
+                  f"+ {footprint['fixed_bytes']} байт постоянных)")
+        except Exception as e:
+            self.ledger_cache = None
+            print(f"Ошибка при загрузке кэша ставок профиля '{self.name}', работаем через БД: {e}")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+profiles = {DEFAULT_PROFILE: Profile(DEFAULT_PROFILE)}
+active_profile = profiles[DEFAULT_PROFILE]
+
+def get_ledger_cache():
+    return active_profile.ledger_cache
+
+def mark_bets_changed():
+    active_profile.data_version += 1
+
+def is_valid_profile_name(name):
+    if not isinstance(name, str) or not PROFILE_NAME_PATTERN.fullmatch(name) or name.endswith(('.', ' ')):
+        return False
+    return name.split('.')[0].strip().upper() not in WINDOWS_RESERVED_NAMES
+
+def list_profiles():
+    names = [DEFAULT_PROFILE]
+    profiles_dir = get_profiles_dir()
+    if os.path.isdir(profiles_dir):
+        names += sorted(f[:-3] for f in os.listdir(profiles_dir) if f.endswith('.db') and f[:-3] != DEFAULT_PROFILE)
+    return names
+
+@eel.expose
+def get_profiles():
+    return {
+        'success': True,
+        'profiles': list_profiles(),
+        'active': active_profile.name,
+        'data_version': active_profile.data_version
+    }
+
+@eel.expose
+def switch_profile(name):
+    global active_profile
+    try:
+        name = str(name or '').strip()
+        if not is_valid_profile_name(name):
+            return {'success': False, 'message': f'Недопустимое имя профиля: {name}'}
+        profile = profiles.get(name)
+        if profile is None:
+            profile = Profile(name)
+            profile.open()
+            profiles[name] = profile
+        active_profile = profile
+        return {'success': True, 'active': profile.name, 'data_version': profile.data_version}
+    except Exception as e:
+        print(f"Ошибка при переключении профиля: {e}")
+        return {'success': False, 'message': f'Ошибка при переключении профиля: {str(e)}'}
+
+@eel.expose
+def calculate_consolidated_stats(profile_names=None):
+    try:
+        if profile_names is not None and not isinstance(profile_names, list):
+            return {'success': False, 'message': 'Список профилей должен быть массивом имен'}
+        names = list(dict.fromkeys(profile_names or list_profiles()))
+        paths = []
+        for name in names:
+            db_path = profiles[name].db_path if name in profiles else get_profile_db_path(name)
+            if not is_valid_profile_name(name) or not os.path.exists(db_path):
+                return {'success': False, 'message': f'Профиль не найден: {name}'}
+            paths.append(db_path)
+        
+        conn = sqlite3.connect(':memory:')
+        conn.row_factory = sqlite3.Row
+        bets = []
+        for offset in range(0, len(paths), MAX_ATTACHED_DATABASES):
+            chunk = paths[offset:offset + MAX_ATTACHED_DATABASES]
+            selects = []
+            for i, db_path in enumerate(chunk):
+                conn.execute(f'ATTACH DATABASE ? AS p{i}', (db_path,))
+                selects.append(f"SELECT date, result, coefficient, bet_amount FROM p{i}.bets WHERE result != 'pending'")
+            cursor = conn.execute(' UNION ALL '.join(selects) + ' ORDER BY date ASC')
+            bets.extend(rows_to_settled_bets(cursor.fetchall()))
+            for i in range(len(chunk)):
+                conn.execute(f'DETACH DATABASE p{i}')
+        conn.close()
+        bets.sort(key=lambda b: b[0])
+        
+        return {
+            'success': True,
+            'profiles': names,
+            'stats': compute_stats(bets),
+            'balance_history': balance_history_by_day(bets)
+        }
+    except Exception as e:
+        print(f"Ошибка при расчете сводной статистики: {e}")
+        return {'success': False, 'message': f'Ошибка при расчете сводной статистики: {str(e)}'}
+
+@eel.expose
+def check_ledger_cache():
+    ledger_cache = get_ledger_cache()
+    if ledger_cache is None:
+        return {'success': True, 'enabled': False}
+    try:
+        mismatches = ledger_cache.verify(active_profile.connection())
+        return {
+            'success': True,
+            'enabled': True,
+            'profile': active_profile.name,
+            'consistent': not mismatches,
+            'mismatches': mismatches[:100],
+            'footprint': ledger_cache.memory_footprint()
+        }
+    except Exception as e:
+        print(f"Ошибка при проверке кэша: {e}")
+        return {'success': False, 'message': f'Ошибка при проверке кэша: {str(e)}'}
+
 @eel.expose
 def get_sources():
-    conn = get_db_connection()
+    ledger_cache = get_ledger_cache()
+    if ledger_cache is not None:
+        return ledger_cache.sources()
+    return query_sources(get_db_connection())
+
+def query_sources(conn):
     cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT source FROM bets WHERE source IS NOT NULL AND source != 'Не указан'")
-    sources = [row['source'] for row in cursor.fetchall()]
-    conn.close()
-    return sources
+    cursor.execute("SELECT DISTINCT source FROM bets WHERE source IS NOT NULL AND source != 'Не указан' ORDER BY source")
+    return [row[0] for row in cursor.fetchall()]
 
 @eel.expose
 def get_available_months():
+    ledger_cache = get_ledger_cache()
+    if ledger_cache is not None:
+        return ledger_cache.available_months()
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT DISTINCT strftime('%m', date) as month FROM bets ORDER BY month DESC")
     months = [row['month'] for row in cursor.fetchall()]
-    conn.close()
     return months
 
+def balance_history_by_day(bets):
+    daily_balances = {}
+    current_balance = 0
+    
+    for date_ordinal, result, coefficient, bet_amount in bets:
+        if result == 'win':
+            current_balance += bet_amount * (coefficient - 1)
+        elif result == 'loss':
+            current_balance -= bet_amount
+        
+        daily_balances[date_ordinal] = current_balance
+    
+    return [(datetime.fromordinal(d).strftime('%Y-%m-%d'), balance) for d, balance in sorted(daily_balances.items())]
+
+def rows_to_settled_bets(rows):
+    return [
+        (datetime.strptime(b['date'], '%Y-%m-%d').toordinal(), b['result'], b['coefficient'], b['bet_amount'])
+        for b in rows
+    ]
+
 def get_source_balance_history(source):
+    ledger_cache = get_ledger_cache()
+    if ledger_cache is not None:
+        return ledger_cache.source_balance_history(source)
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -108,26 +561,14 @@ def get_source_balance_history(source):
         ORDER BY date ASC
     '''
     cursor.execute(query, (source,))
-    bets = cursor.fetchall()
-    
-    daily_balances = {}
-    current_balance = 0
-    
-    for bet in bets:
-        bet_date = datetime.strptime(bet['date'], '%Y-%m-%d').date()
-        
-        if bet['result'] == 'win':
-            current_balance += bet['bet_amount'] * (bet['coefficient'] - 1)
-        elif bet['result'] == 'loss':
-            current_balance -= bet['bet_amount']
-        
-        daily_balances[bet_date] = current_balance
+    bets = rows_to_settled_bets(cursor.fetchall())
     
-    conn.close()
-    return sorted([(date.strftime('%Y-%m-%d'), balance) for date, balance in daily_balances.items()], key=lambda x: x[0])
+    return balance_history_by_day(bets)
 
-@eel.expose
-def calculate_stats(date_filter=None, coeff_filter=None, source_filter=None):
+def get_settled_bets(date_filter=None, coeff_filter=None, source_filter=None):
+    ledger_cache = get_ledger_cache()
+    if ledger_cache is not None:
+        return ledger_cache.settled_bets(date_filter, coeff_filter, source_filter)
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -135,13 +576,7 @@ def calculate_stats(date_filter=None, coeff_filter=None, source_filter=None):
     params = []
     
     if date_filter and date_filter != 'all':
-        month_mapping = {
-            'january': '01', 'february': '02', 'march': '03',
-            'april': '04', 'may': '05', 'june': '06',
-            'july': '07', 'august': '08', 'september': '09',
-            'october': '10', 'november': '11', 'december': '12'
-        }
-        month_num = month_mapping.get(date_filter.lower())
+        month_num = MONTH_MAPPING.get(date_filter.lower())
         if month_num:
             query += ' AND strftime("%m", date) = ?'
             params.append(month_num)
@@ -162,33 +597,35 @@ def calculate_stats(date_filter=None, coeff_filter=None, source_filter=None):
     
     query += ' ORDER BY date ASC'
     cursor.execute(query, params)
-    bets = cursor.fetchall()
-    
+    bets = rows_to_settled_bets(cursor.fetchall())
+    return bets
+
+def compute_stats(bets):
     total_bets = len(bets)
-    won_bets = len([b for b in bets if b['result'] == 'win'])
-    returned_bets = len([b for b in bets if b['result'] == 'return'])
+    won_bets = len([b for b in bets if b[1] == 'win'])
+    returned_bets = len([b for b in bets if b[1] == 'return'])
     
     profit = sum(
-        b['bet_amount'] * (b['coefficient'] - 1) if b['result'] == 'win' else
-        -b['bet_amount'] if b['result'] == 'loss' else 0
-        for b in bets
+        amount * (coefficient - 1) if result == 'win' else
+        -amount if result == 'loss' else 0
+        for _, result, coefficient, amount in bets
     )
     
     pass_rate = (won_bets / (total_bets - returned_bets)) * 100 if (total_bets - returned_bets) > 0 else 0
     
-    total_invested = sum(b['bet_amount'] for b in bets if b['result'] != 'return')
+    total_invested = sum(amount for _, result, _, amount in bets if result != 'return')
     roi = (profit / total_invested) * 100 if total_invested > 0 else 0
     
-    avg_coefficient = sum(b['coefficient'] for b in bets) / total_bets if total_bets > 0 else 0
+    avg_coefficient = sum(b[2] for b in bets) / total_bets if total_bets > 0 else 0
     
     balance = 0
     max_balance = 0
     max_drawdown = 0
-    for b in bets:
-        if b['result'] == 'win':
-            balance += b['bet_amount'] * (b['coefficient'] - 1)
-        elif b['result'] == 'loss':
-            balance -= b['bet_amount']
+    for _, result, coefficient, amount in bets:
+        if result == 'win':
+            balance += amount * (coefficient - 1)
+        elif result == 'loss':
+            balance -= amount
         
         if balance > max_balance:
             max_balance = balance
@@ -202,43 +639,17 @@ def calculate_stats(date_filter=None, coeff_filter=None, source_filter=None):
     loss_streak = 0
     last_result = None
     
-    for b in bets:
-        if b['result'] == 'win':
+    for _, result, _, _ in bets:
+        if result == 'win':
             current_streak = current_streak + 1 if last_result == 'win' else 1
             win_streak = max(win_streak, current_streak)
-        elif b['result'] == 'loss':
+        elif result == 'loss':
             current_streak = current_streak + 1 if last_result == 'loss' else 1
             loss_streak = max(loss_streak, current_streak)
         
-        last_result = b['result']
-    
-    balance_history = []
-    daily_balances = {}
-    current_date = None
-    current_balance = 0
-    
-    for b in bets:
-        bet_date = datetime.strptime(b['date'], '%Y-%m-%d').date()
-        if current_date is None or bet_date != current_date:
-            if current_date is not None:
-                daily_balances[current_date] = current_balance
-            current_date = bet_date
-        
-        if b['result'] == 'win':
-            current_balance += b['bet_amount'] * (b['coefficient'] - 1)
-        elif b['result'] == 'loss':
-            current_balance -= b['bet_amount']
-    
-    if current_date is not None:
-        daily_balances[current_date] = current_balance
-    
-    balance_history = sorted([(date.strftime('%Y-%m-%d'), balance) for date, balance in daily_balances.items()], key=lambda x: x[0])
-    
-    conn.close()
+        last_result = result
     
-    chart_url = generate_chart(balance_history, date_filter, source_filter) if balance_history else None
-    
-    stats_dict = {
+    return {
         'total_profit': profit,
         'pass_rate': pass_rate,
         'won_bets': won_bets,
@@ -250,6 +661,14 @@ def calculate_stats(date_filter=None, coeff_filter=None, source_filter=None):
         'win_streak': win_streak,
         'loss_streak': loss_streak
     }
+
+@eel.expose
+def calculate_stats(date_filter=None, coeff_filter=None, source_filter=None):
+    bets = get_settled_bets(date_filter, coeff_filter, source_filter)
+    stats_dict = compute_stats(bets)
+    balance_history = balance_history_by_day(bets)
+    
+    chart_url = generate_chart(balance_history, date_filter, source_filter) if balance_history else None
     
     bets_for_table = get_bets_for_table(date_filter, coeff_filter, source_filter)
     available_months = get_available_months()
@@ -411,6 +830,9 @@ def generate_chart(balance_history, date_filter=None, source_filter=None):
     return base64.b64encode(img.getvalue()).decode('utf-8')
 
 def get_bets_for_table(date_filter=None, coeff_filter=None, source_filter=None):
+    ledger_cache = get_ledger_cache()
+    if ledger_cache is not None:
+        return ledger_cache.bets_for_table(date_filter, coeff_filter, source_filter)
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -418,13 +840,7 @@ def get_bets_for_table(date_filter=None, coeff_filter=None, source_filter=None):
     params = []
     
     if date_filter and date_filter != 'all':
-        month_mapping = {
-            'january': '01', 'february': '02', 'march': '03',
-            'april': '04', 'may': '05', 'june': '06',
-            'july': '07', 'august': '08', 'september': '09',
-            'october': '10', 'november': '11', 'december': '12'
-        }
-        month_num = month_mapping.get(date_filter.lower())
+        month_num = MONTH_MAPPING.get(date_filter.lower())
         if month_num:
             query += ' WHERE strftime("%m", date) = ?'
             params.append(month_num)
@@ -463,15 +879,21 @@ def get_bets_for_table(date_filter=None, coeff_filter=None, source_filter=None):
         bet_dict['source'] = bet_dict.get('source', 'Не указан')
         bets_list.append(bet_dict)
     
-    conn.close()
     return bets_list
 
+def get_bets_page(date_filter=None, coeff_filter=None, source_filter=None, offset=0, limit=100):
+    ledger_cache = get_ledger_cache()
+    if ledger_cache is not None:
+        return ledger_cache.bets_page(date_filter, coeff_filter, source_filter, offset, limit)
+    bets = get_bets_for_table(date_filter, coeff_filter, source_filter)
+    return bets[offset:offset + limit], len(bets)
+
 @eel.expose
 def add_bet(bet_data):
     try:
         date_str = bet_data['date'].replace(',', '.')
         day, month, year = map(int, date_str.split('.'))
-        date = f"{year}-{month:02d}-{day:02d}"
+        date = datetime(year, month, day).strftime('%Y-%m-%d')
         
         source = bet_data.get('source', 'Не указан')
         if not source or source == 'Выберите источник':
@@ -480,22 +902,27 @@ def add_bet(bet_data):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO bets (event, coefficient, bet_amount, date, result, source)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+        values = (
             bet_data['event'],
             float(bet_data['coefficient']),
             float(bet_data['bet_amount']),
             date,
             bet_data['result'],
             source
-        ))
+        )
+        cursor.execute('''
+            INSERT INTO bets (event, coefficient, bet_amount, date, result, source)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', values)
         
         conn.commit()
-        conn.close()
-        return {'success': True, 'message': 'Ставка успешно добавлена'}
+        mark_bets_changed()
+        ledger_cache = get_ledger_cache()
+        if ledger_cache is not None:
+            ledger_cache.insert(cursor.lastrowid, *values)
+        return {'success': True, 'message': 'Ставка успешно добавлена', 'id': cursor.lastrowid}
     except Exception as e:
+        rollback_db()
         print(f"Ошибка при добавлении ставки: {e}")
         return {'success': False, 'message': f'Ошибка при добавлении ставки: {str(e)}'}
 
@@ -504,12 +931,21 @@ def update_bet(bet_id, bet_data):
     try:
         date_str = bet_data['date'].replace(',', '.')
         day, month, year = map(int, date_str.split('.'))
-        date = f"{year}-{month:02d}-{day:02d}"
+        date = datetime(year, month, day).strftime('%Y-%m-%d')
         
         source = bet_data.get('source', 'Не указан')
         if not source or source == 'Выберите источник':
             source = 'Не указан'
         
+        values = (
+            bet_data['event'],
+            float(bet_data['coefficient']),
+            float(bet_data['bet_amount']),
+            date,
+            bet_data['result'],
+            source
+        )
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -522,20 +958,18 @@ def update_bet(bet_id, bet_data):
                 result = ?,
                 source = ?
             WHERE id = ?
-        ''', (
-            bet_data['event'],
-            float(bet_data['coefficient']),
-            float(bet_data['bet_amount']),
-            date,
-            bet_data['result'],
-            source,
-            bet_id
-        ))
+        ''', values + (bet_id,))
         
         conn.commit()
-        conn.close()
+        if not cursor.rowcount:
+            return {'success': False, 'message': 'Ставка не найдена'}
+        mark_bets_changed()
+        ledger_cache = get_ledger_cache()
+        if ledger_cache is not None:
+            ledger_cache.update(int(bet_id), *values)
         return {'success': True, 'message': 'Ставка успешно обновлена'}
     except Exception as e:
+        rollback_db()
         print(f"Ошибка при обновлении ставки: {e}")
         return {'success': False, 'message': f'Ошибка при обновлении ставки: {str(e)}'}
 
@@ -553,10 +987,8 @@ def get_bet(bet_id):
             bet_date = datetime.strptime(bet_dict['date'], '%Y-%m-%d')
             bet_dict['formatted_date'] = bet_date.strftime('%d.%m.%Y')
             bet_dict['source'] = bet_dict.get('source', 'Не указан')
-            conn.close()
             return {'success': True, 'bet': bet_dict}
         else:
-            conn.close()
             return {'success': False, 'message': 'Ставка не найдена'}
     except Exception as e:
         print(f"Ошибка при получении ставки: {e}")
@@ -570,9 +1002,15 @@ def delete_bet(bet_id):
         
         cursor.execute('DELETE FROM bets WHERE id = ?', (bet_id,))
         conn.commit()
-        conn.close()
+        if not cursor.rowcount:
+            return {'success': False, 'message': 'Ставка не найдена'}
+        mark_bets_changed()
+        ledger_cache = get_ledger_cache()
+        if ledger_cache is not None:
+            ledger_cache.remove(int(bet_id))
         return {'success': True, 'message': 'Ставка успешно удалена'}
     except Exception as e:
+        rollback_db()
         print(f"Ошибка при удалении ставки: {e}")
         return {'success': False, 'message': f'Ошибка при удалении ставки: {str(e)}'}
 
@@ -623,7 +1061,6 @@ def export_to_excel():
         
         excel_base64 = base64.b64encode(excel_data).decode('utf-8')
         
-        conn.close()
         return {'success': True, 'data': excel_base64, 'filename': 'bet_history.xlsx'}
     except Exception as e:
         print(f"Ошибка при экспорте в Excel: {e}")
@@ -639,16 +1076,15 @@ def import_from_excel(excel_data):
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM bets')
-        conn.commit()
         
         for _, row in df.iterrows():
             try:
                 date_str = str(row['Дата']).replace(',', '.')
                 if '-' in date_str:
-                    date = date_str
+                    date = datetime.strptime(date_str[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
                 else:
                     day, month, year = map(int, date_str.split('.'))
-                    date = f"{year}-{month:02d}-{day:02d}"
+                    date = datetime(year, month, day).strftime('%Y-%m-%d')
                 
                 result_text = str(row['Результат']).lower()
                 if result_text == 'win':
@@ -680,22 +1116,201 @@ def import_from_excel(excel_data):
                 continue
         
         conn.commit()
-        conn.close()
+        mark_bets_changed()
+        if get_ledger_cache() is not None:
+            active_profile.load_cache()
         return {'success': True, 'message': 'Данные успешно импортированы'}
     except Exception as e:
+        rollback_db()
         print(f"Ошибка при импорте из Excel: {e}")
         return {'success': False, 'message': f'Ошибка при импорте: {str(e)}'}
 
 @eel.expose
 def close_app():
+    for profile in profiles.values():
+        profile.close()
     kill_child_processes()
     os._exit(0)
 
 def close_callback(route, websockets):
     close_app()
 
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_GZIP_MIN_SIZE = 1024
+API_MAX_BODY_SIZE = 50 * 1024 * 1024
+
+api_app = bottle.Bottle()
+
+def api_json():
+    # bottle.request.json отклоняет тела больше MEMFILE_MAX (100 КБ), а импорт Excel
+    # передает весь файл в base64, поэтому тело читается здесь со своим лимитом
+    ctype = bottle.request.content_type.lower().split(';')[0].strip()
+    if ctype not in ('application/json', 'application/json-rpc'):
+        return None
+    if bottle.request.content_length > API_MAX_BODY_SIZE:
+        raise bottle.HTTPError(413, 'Request entity too large')
+    data = bottle.request.body.read(API_MAX_BODY_SIZE + 1)
+    if len(data) > API_MAX_BODY_SIZE:
+        raise bottle.HTTPError(413, 'Request entity too large')
+    if not data:
+        return None
+    try:
+        return json.loads(data)
+    except (ValueError, TypeError):
+        raise bottle.HTTPError(400, 'Invalid JSON')
+
+def api_params():
+    params = dict(bottle.request.query.decode())
+    body = api_json()
+    if isinstance(body, dict):
+        params.update(body)
+    return params
+
+def api_filters(params):
+    coeff_filter = params.get('coeff_filter')
+    if coeff_filter is None and params.get('min_coeff') not in (None, '') and params.get('max_coeff') not in (None, ''):
+        coeff_filter = {'min': float(params['min_coeff']), 'max': float(params['max_coeff'])}
+    return params.get('date_filter'), coeff_filter, params.get('source_filter')
+
+def json_response(data, status=200):
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    bottle.response.status = status
+    bottle.response.content_type = 'application/json; charset=utf-8'
+    bottle.response.set_header('Vary', 'Accept-Encoding')
+    if len(body) >= API_GZIP_MIN_SIZE and 'gzip' in bottle.request.get_header('Accept-Encoding', ''):
+        body = gzip.compress(body, compresslevel=5)
+        bottle.response.set_header('Content-Encoding', 'gzip')
+    return body
+
+def api_route(path, method='GET'):
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            try:
+                return json_response(func(*args, **kwargs))
+            except bottle.HTTPError as e:
+                return json_response({'success': False, 'message': f'Некорректный запрос: {e.body}'}, e.status_code)
+            except (ValueError, TypeError, KeyError) as e:
+                return json_response({'success': False, 'message': f'Некорректный запрос: {str(e)}'}, 400)
+            except Exception as e:
+                print(f"Ошибка API {path}: {e}")
+                return json_response({'success': False, 'message': f'Ошибка сервера: {str(e)}'}, 500)
+        api_app.route(path, method=method, callback=wrapper)
+        return func
+    return decorator
+
+@api_route('/api/calculate_stats', method=['GET', 'POST'])
+def api_calculate_stats():
+    return calculate_stats(*api_filters(api_params()))
+
+@api_route('/api/stats', method=['GET', 'POST'])
+def api_stats():
+    bets = get_settled_bets(*api_filters(api_params()))
+    return {
+        'success': True,
+        'profile': active_profile.name,
+        'data_version': active_profile.data_version,
+        'stats': compute_stats(bets),
+        'balance_history': balance_history_by_day(bets),
+        'sources': get_sources(),
+        'available_months': get_available_months()
+    }
+
+@api_route('/api/chart', method=['GET', 'POST'])
+def api_chart():
+    params = api_params()
+    date_filter, coeff_filter, source_filter = api_filters(params)
+    balance_history = balance_history_by_day(get_settled_bets(date_filter, coeff_filter, source_filter))
+    chart_url = generate_chart(balance_history, date_filter, source_filter) if balance_history else None
+    return {'success': True, 'chart_url': chart_url}
+
+@api_route('/api/bets', method=['GET', 'POST'])
+def api_bets():
+    params = api_params()
+    page = max(int(params.get('page', 1)), 1)
+    page_size = min(max(int(params.get('page_size', API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+    bets, total = get_bets_page(*api_filters(params), offset=(page - 1) * page_size, limit=page_size)
+    return {'success': True, 'bets': bets, 'total': total, 'page': page, 'page_size': page_size}
+
+@api_route('/api/bet', method='POST')
+def api_add_bet():
+    return add_bet(api_json())
+
+@api_route('/api/bet/<bet_id:int>', method='GET')
+def api_get_bet(bet_id):
+    return get_bet(bet_id)
+
+@api_route('/api/bet/<bet_id:int>', method='PUT')
+def api_update_bet(bet_id):
+    return update_bet(bet_id, api_json())
+
+@api_route('/api/bet/<bet_id:int>', method='DELETE')
+def api_delete_bet(bet_id):
+    return delete_bet(bet_id)
+
+@api_route('/api/export', method='GET')
+def api_export():
+    return export_to_excel()
+
+@api_route('/api/import', method='POST')
+def api_import():
+    return import_from_excel(api_json()['data'])
+
+@api_route('/api/profiles', method='GET')
+def api_profiles():
+    return get_profiles()
+
+@api_route('/api/consolidated_stats', method=['GET', 'POST'])
+def api_consolidated_stats():
+    profile_names = bottle.request.query.decode().getall('profiles')
+    body = api_json()
+    if isinstance(body, dict) and 'profiles' in body:
+        profile_names = body['profiles']
+    if not isinstance(profile_names, list) or not all(isinstance(name, str) for name in profile_names):
+        raise ValueError('profiles должен быть списком имен профилей')
+    return calculate_consolidated_stats(profile_names or None)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Bet Tracker PRO', allow_abbrev=False)
+    parser.add_argument('--headless', action='store_true',
+                        help='запустить только HTTP/JSON API без окна браузера')
+    parser.add_argument('--host', default='localhost', help='адрес для API (по умолчанию localhost)')
+    parser.add_argument('--port', type=int, default=8000, help='порт для API (по умолчанию 8000)')
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, help='профиль, активный при запуске')
+    parser.add_argument('--no-ledger-cache', action='store_true',
+                        help='не загружать кэш ставок, читать все данные из БД')
+    return parser.parse_args()
+
+def headless_app(environ, start_response):
+    return api_app(environ, start_response)
+
+def run_headless(host, port):
+    print(f"API запущен: http://{host}:{port}/api/stats")
+    # eel.start регистрирует свои маршруты (index.html, /eel) только на экземпляре
+    # bottle.Bottle. Обертка оставляет снаружи одно API: без окна и websocket,
+    # закрытие которых завершает процесс.
+    eel.start(mode=False,
+             host=host,
+             port=port,
+             app=headless_app,
+             suppress_error=True)
+
 if __name__ == '__main__':
-    check_and_create_db()
+    args = parse_args()
+    LEDGER_CACHE_ENABLED = not args.no_ledger_cache
+    active_profile.open()
+    if args.profile != DEFAULT_PROFILE:
+        result = switch_profile(args.profile)
+        if not result['success']:
+            print(result['message'])
+            sys.exit(1)
+    
+    if args.headless:
+        try:
+            run_headless(args.host, args.port)
+        finally:
+            kill_child_processes()
+        sys.exit(0)
     
     try:
         port = random.randint(8000, 8999)
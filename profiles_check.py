@@ -0,0 +1,96 @@
+"""Проверка профилей и сводной статистики.
+
+Запускается из корня проекта: python profiles_check.py
+Работает во временной папке, рабочие данные не затрагиваются.
+"""
+import sys
+import tempfile
+
+import main
+
+def bet(day, result='win', amount='10', coefficient='2'):
+    return {
+        'event': 'Матч',
+        'coefficient': coefficient,
+        'bet_amount': amount,
+        'date': f'{day}.03.2024',
+        'result': result,
+        'source': 'Канал'
+    }
+
+def total_bets():
+    return main.compute_stats(main.get_settled_bets())['total_bets']
+
+def check_names():
+    for name in ['', '../x', 'a/b', '.hidden', 'CON', 'con', 'com3', 'LPT9', 'lpt9.x', 'Nul.db',
+                 'Work.', 'abc\n', 'a' * 65]:
+        assert not main.is_valid_profile_name(name), repr(name)
+        # switch_profile обрезает пробелы и переводы строк по краям имени
+        if name == name.strip():
+            assert not main.switch_profile(name)['success'], repr(name)
+    for name in ['Conway', 'COM10', 'Банк 2', 'Work.2']:
+        assert main.is_valid_profile_name(name), name
+    assert main.active_profile.name == main.DEFAULT_PROFILE
+
+def check_isolation():
+    main.active_profile.open()
+    main.add_bet(bet(1))
+    main.add_bet(bet(2, 'loss'))
+    default = main.active_profile
+    default_cache = default.ledger_cache
+
+    assert main.switch_profile('Второй')['success']
+    second = main.active_profile
+    assert second is not default and second.ledger_cache is not default_cache
+    assert total_bets() == 0 and second.data_version == 0
+    main.add_bet(bet(3, amount='5'))
+    assert total_bets() == 1 and second.data_version == 1
+
+    assert main.switch_profile(main.DEFAULT_PROFILE)['success']
+    assert main.active_profile is default and default.ledger_cache is default_cache
+    assert total_bets() == 2 and default.data_version == 2
+    assert main.check_ledger_cache()['consistent']
+
+    assert main.switch_profile('Второй')['success']
+    assert main.active_profile is second and total_bets() == 1
+    assert main.get_profiles()['profiles'] == [main.DEFAULT_PROFILE, 'Второй']
+    main.switch_profile(main.DEFAULT_PROFILE)
+
+def check_consolidated():
+    result = main.calculate_consolidated_stats()
+    assert result['success'] and result['stats']['total_bets'] == 3, result
+    assert result['stats']['total_profit'] == 10 - 10 + 5
+
+    result = main.calculate_consolidated_stats(['Второй', 'Второй'])
+    assert result['profiles'] == ['Второй'] and result['stats']['total_bets'] == 1, result
+
+    assert not main.calculate_consolidated_stats('Второй')['success']
+    assert not main.calculate_consolidated_stats(['Нет такого'])['success']
+    assert not main.calculate_consolidated_stats(['CON'])['success']
+
+    # Больше профилей, чем SQLite подключает через ATTACH за один запрос
+    names = [f'Банк {i}' for i in range(main.MAX_ATTACHED_DATABASES + 3)]
+    for i, name in enumerate(names):
+        assert main.switch_profile(name)['success']
+        main.add_bet(bet(i % 28 + 1))
+    main.switch_profile(main.DEFAULT_PROFILE)
+    result = main.calculate_consolidated_stats(names)
+    assert result['success'] and result['stats']['total_bets'] == len(names), result
+    result = main.calculate_consolidated_stats()
+    assert result['stats']['total_bets'] == len(names) + 3, result
+    dates = [day for day, _ in result['balance_history']]
+    assert dates == sorted(dates)
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        main.get_application_path = lambda: tmp
+        main.active_profile = main.profiles[main.DEFAULT_PROFILE] = main.Profile(main.DEFAULT_PROFILE)
+        try:
+            check_names()
+            check_isolation()
+            check_consolidated()
+        finally:
+            for profile in main.profiles.values():
+                profile.close()
+    print('Профили и сводная статистика работают корректно')
+    sys.exit(0)